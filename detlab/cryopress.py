@@ -10,23 +10,51 @@
 """
 
 import errno
+import functools
+import math
 import os
 import sys
 import json
+import time
+import signal
 from datetime import datetime
 import socket
-import select
 import argparse
 
-from influxdb_client import InfluxDBClient, Point
-from influxdb_client.client.write_api import SYNCHRONOUS
-
 # -----------------------------------------------------------------------------
 # control codes
 # -----------------------------------------------------------------------------
 ACK  = b'\x06\x0d\x0a'
 NCK  = b'\x15\x0d\x0a'
 ENQ  = b'\x05'
+CRLF = b'\r\n'
+
+# seconds to wait for the gauge to reply
+REPLY_TIMEOUT = 3
+
+LOG_FILE = "pressure.log"
+MAX_LOG_SIZE = 1024000
+# in --daemon mode, buffered log lines are written out at least this often (sec)
+LOG_FLUSH_INTERVAL = 10.
+
+# -----------------------------------------------------------------------------
+# status strings, indexed by the numeric value returned by the gauge
+# -----------------------------------------------------------------------------
+POWER_STATES = (
+    "gauge cannot be turned on/off",
+    "gauge turned off",
+    "gauge turned on",
+)
+
+PRESSURE_ERRORS = (
+    "OK",
+    "underrange",
+    "overrange",
+    "sensor error",
+    "sensor off",
+    "no sensor",
+    "identification error",
+)
 
 # -----------------------------------------------------------------------------
 # @fn     power_state
@@ -34,12 +62,9 @@ ENQ  = b'\x05'
 # -----------------------------------------------------------------------------
 def power_state(argument):
     """ Get Power State """
-    switcher = {
-        0: "gauge cannot be turned on/off",
-        1: "gauge turned off",
-        2: "gauge turned on"
-    }
-    return switcher.get(argument, "unknown")
+    if 0 <= argument < len(POWER_STATES):
+        return POWER_STATES[argument]
+    return "unknown"
 
 # -----------------------------------------------------------------------------
 # @fn     pressure_error
@@ -47,76 +72,258 @@ def power_state(argument):
 # -----------------------------------------------------------------------------
 def pressure_error(argument):
     """ Get Pressure Error String """
-    switcher = {
-        0: "OK",
-        1: "underrange",
-        2: "overrange",
-        3: "sensor error",
-        4: "sensor off",
-        5: "no sensor",
-        6: "identification error",
-    }
-    return switcher.get(argument, "unknown")
-
-# -----------------------------------------------------------------------------
-# @fn     get_reply
-# @brief  read socket until <LF> and return reply
-# -----------------------------------------------------------------------------
-def get_reply():
-    """ Get Reply String """
-    reply = None
-    while True:
-        ready = select.select([sock],[],[],3)
-        if ready[0]:
-            reply = sock.recv(1024)
-        else:
-            print("get_reply: select timeout")
-            break
-        if b'\n' in reply:
-            break
-    return reply
+    if 0 <= argument < len(PRESSURE_ERRORS):
+        return PRESSURE_ERRORS[argument]
+    return "unknown"
 
 # -----------------------------------------------------------------------------
-# @fn     send_command
-# @brief  append <CR><LF> to command and send over socket
+# @class  TPGClient
+# @brief  connection to the TPG controller
+#
+# Holds the socket along with the state that goes with it: the receive
+# buffers and the pre-encoded pressure read commands.
 # -----------------------------------------------------------------------------
-def send_command(command):
-    """ Send Command String """
-    command = command + "\r\n"
-    sock.sendall(command.encode( 'UTF-8' ))
-
-def read_pressure(read_type):
-    """ Read Pressure """
-
-    retlist = [datetime.now().strftime("%D %T")]
+class TPGClient:
+    """ Class to handle communication with the TPG controller """
+    def __init__(self, host, port, presschans):
+        self.presschans = presschans
+        # pressure read commands are fixed, encode them once
+        self.pr_cmds = {ichan: b'PR%d' % ichan + CRLF for ichan in presschans}
+        # bytes received from the gauge but not yet returned by get_reply()
+        self.rxbuf = bytearray()
+        # fixed buffer that each recv is read into
+        self.rxchunk = memoryview(bytearray(1024))
+        # set when a reply goes missing, after which a late reply may still
+        # arrive and be read in place of the next one
+        self.lost_sync = False
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            self.sock.connect( (host, port) )
+            # commands are only a few bytes, don't let Nagle hold them back
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # blocking reads, giving up if the gauge doesn't answer in time
+            self.sock.settimeout(REPLY_TIMEOUT)
+        except socket.error:
+            self.close()
+            raise
+
+    def close(self):
+        """ Close the connection """
+        self.sock.close()
+
+    # -------------------------------------------------------------------------
+    # @fn     get_reply
+    # @brief  read socket until <LF> and return reply
+    #
+    # Anything received after the <LF> is kept in rxbuf for the next call.
+    # -------------------------------------------------------------------------
+    def get_reply(self):
+        """ Get Reply String """
+        rxbuf = self.rxbuf
+        scan = 0
+        while True:
+            # only search the bytes that arrived since the last look
+            idx = rxbuf.find(b'\n', scan)
+            if idx != -1:
+                reply = bytes(rxbuf[:idx+1])
+                del rxbuf[:idx+1]
+                return reply
+            scan = len(rxbuf)
+            try:
+                nbytes = self.sock.recv_into(self.rxchunk)
+            except socket.timeout:
+                print("get_reply: timeout")
+                break
+            if not nbytes:
+                print("get_reply: connection closed")
+                break
+            rxbuf.extend(self.rxchunk[:nbytes])
+        # no complete reply, return whatever partial data there is
+        reply = bytes(rxbuf) if rxbuf else None
+        rxbuf.clear()
+        return reply
+
+    # -------------------------------------------------------------------------
+    # @fn     send_command
+    # @brief  append <CR><LF> to command and send over socket
+    # -------------------------------------------------------------------------
+    def send_command(self, command):
+        """ Send Command (bytes) """
+        self.sock.sendall(command + CRLF)
+
+    # -------------------------------------------------------------------------
+    # @fn     enquire
+    # @brief  send ENQ and return the data for the acknowledged command
+    # -------------------------------------------------------------------------
+    def enquire(self):
+        """ Send ENQ and get reply """
+        self.sock.sendall(ENQ)
+        return self.get_reply()
+
+    # -------------------------------------------------------------------------
+    # @fn     read_pressure
+    # @brief  read all configured pressure channels
+    # -------------------------------------------------------------------------
+    def read_pressure(self, read_type, now=None):
+        """ Read Pressure
+
+        Returns the timestamp and a dict of pressure readings (mTorr) keyed
+        by channel number. The timestamp is taken from now, if given.
+        A channel whose reply is missing or malformed reads as NaN, and
+        lost_sync is set.
+        """
+
+        if now is None:
+            now = datetime.now()
+        timestamp = now.strftime("%D %T")
+        readings = {}
+
+        send = self.sock.sendall
+        get_reply = self.get_reply
+        for ichan in self.presschans:
+
+            send(self.pr_cmds[ichan])
+            rep=get_reply()
+            if rep!=ACK:
+                print("read_pressure: didn't receive ACK")
+                self.lost_sync = True
+
+            # a single ENQ requests the data for the command just acknowledged
+            send(ENQ)
+            rep=get_reply()
+            if rep is None:
+                print("read_pressure: didn't receive any data")
+                readings[ichan] = math.nan
+                self.lost_sync = True
+                continue
+
+            try:
+                ans=rep.decode( 'UTF-8' )
+                ans=ans.split(',')
+                err = int(ans[0])
+                value = float(ans[1])*1000.
+            except (IndexError, ValueError):
+                print("read_pressure: bad reply %r" % rep)
+                readings[ichan] = math.nan
+                self.lost_sync = True
+                continue
+
+            readings[ichan] = value
+            if read_type== "read":
+                print(value," mTorr chan ", ichan)
 
-    for ichan in config['presschans']:
+            if err:
+                print(pressure_error(err))
 
-        send_command('PR%d' % ichan)
-        rep=get_reply()
-        if rep==ACK:
-            sock.sendall(ENQ)
-        else:
-            print("read_pressure: didn't receive ACK")
+        return timestamp, readings
 
-        sock.sendall(ENQ)
-        rep=get_reply()
-        ans=rep.decode( 'UTF-8' )
-        ans=ans.split(',')
+# -----------------------------------------------------------------------------
+# @class  PressureLog
+# @brief  append-only log file, kept open between writes
+#
+# The file size is tracked in-process so that rollover doesn't need to
+# stat the file for every sample. Lines are buffered and only flushed to
+# the file once flush_interval seconds have passed since the last flush,
+# checked on each write and on each call to flush().
+# -----------------------------------------------------------------------------
+class PressureLog:
+    """ Class to handle the pressure log file """
+    def __init__(self, path, header, line_format, flush_interval=0.):
+        self.path = path
+        self.header = header
+        # formats one log line, built once rather than per sample
+        self.format_line = line_format.format
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+        self.file = None
+        self.size = 0
+
+    def open(self):
+        """ Open log file for append, writing the header if it is new """
+        self.file = open(self.path, 'a', buffering=8192)
+        self.size = os.fstat(self.file.fileno()).st_size
+        if self.size == 0:
+            self.file.write(self.header)
+            self.size += len(self.header)
+
+    def write(self, line, now):
+        """ Append line to the log file """
+        if self.file is None:
+            self.open()
+        # if the log file has grown over MAX_LOG_SIZE then rename it and start a new log file
+        if self.size > MAX_LOG_SIZE:
+            self.file.close()
+            os.rename(self.path, self.path + "." + now.isoformat(timespec='seconds'))
+            self.open()
+        self.file.write(line)
+        self.size += len(line)
+        self.flush()
+
+    def flush(self):
+        """ Flush buffered lines if flush_interval has passed """
+        if self.file is not None and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.file.flush()
+            self.last_flush = time.monotonic()
+
+    def close(self):
+        """ Close log file """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
 
-        try:
-            retlist.append(float(ans[1])*1000.)
+# -----------------------------------------------------------------------------
+# @fn     log_pressure
+# @brief  read pressure and write it to the log file and InfluxDB
+# @param  tpg - TPGClient to read from
+# @param  write - writes records to InfluxDB, with the bucket, org and time
+#                 precision already bound, or None to skip the database
+# @param  pressfile - PressureLog to append to
+# -----------------------------------------------------------------------------
+def log_pressure(tpg, write, pressfile):
+    """ Log Pressure """
+
+    now = datetime.now()
+    # read the pressure now (the "log" parameter is non-verbose)
+    stamp, pressure = tpg.read_pressure("log", now)
+
+    if write is not None:
+        # send all channels in a single request, as line protocol
+        # time stamped to the second, which is all the sample rate needs;
+        # channels that weren't read (NaN) can't be sent
+        epoch = int(now.timestamp())
+        lines = ["measurement,channel=%d pressure=%r %d" % (ichan, value, epoch)
+                 for ichan, value in pressure.items() if math.isfinite(value)]
+        if lines:
+            print("Writing to InfluxDB... ", lines)
+            write(record=lines)
+
+    pressfile.write(pressfile.format_line(stamp, *pressure.values()), now)
 
-            if read_type== "read":
-                print(float(ans[1])*1000.," mTorr chan ", ichan)
-        except IndexError:
-            print("read_pressure: didn't receive any data")
-            retlist.append(-1.0)
+# -----------------------------------------------------------------------------
+# @fn     load_config
+# @brief  read the .json configuration file
+# @param  config_file - path to the .json file
+# @return configuration dictionary
+# -----------------------------------------------------------------------------
+def load_config(config_file):
+    """ Load configuration """
+    with open(config_file) as cfg_fl:
+        cfg = json.load(cfg_fl)
 
-        if int(ans[0]) != 0:
-            print(pressure_error(int(ans[0])))
+    cfg['influxdb_client'] = ('influxdb_url' in cfg and 'influxdb_token' in cfg
+                              and 'influxdb_org' in cfg)
+    return cfg
 
-    return retlist
+# -----------------------------------------------------------------------------
+# @fn     signal_handler
+# @brief  exit cleanly on SIGTERM so that open connections are closed
+# -----------------------------------------------------------------------------
+def signal_handler(signum, frame):
+    """ Signal handler """
+    _ = frame
+    print("Signal %d received, exiting" % signum)
+    sys.exit(0)
 
 # -----------------------------------------------------------------------------
 # @fn     main
@@ -125,120 +332,140 @@ def read_pressure(read_type):
 if __name__ == "__main__":
 
     parser=argparse.ArgumentParser(description='Pfeiffer TPG controller')
-    parser.add_argument('config_file',
-                        help='.json file with configuration parameters',
-                        default=None)
+    parser.add_argument('config_file', nargs='?',
+                        help='.json file with configuration parameters '
+                             '(default logcryo.json)',
+                        default='logcryo.json')
     parser.add_argument('--power', metavar='[on|off|?]', nargs=1,
                         type=str, help='turn gauge on|off or read state with ?')
     parser.add_argument('--read', action='store_true',
                         help='read pressure measurement')
     parser.add_argument('--log', action='store_true',
                         help='log pressure measurement')
+    parser.add_argument('--daemon', action='store_true',
+                        help='with --log, keep running and log every --interval seconds')
+    parser.add_argument('--interval', metavar='SEC', type=float, default=60.,
+                        help='logging interval in seconds for --daemon (default 60)')
     parser.add_argument('--com', metavar='mnemonic', nargs=1, type=str,
                         help='send mnemonic command string to controller (no spaces!)')
     args=parser.parse_args()
 
+    if args.daemon and not args.log:
+        parser.error('--daemon requires --log')
+    if args.daemon and (args.read or args.power or args.com):
+        parser.error('--daemon cannot be combined with --read, --power or --com')
+
+    if len(sys.argv)==1:
+        sys.exit(1)
+
     # read config file
-    if args.config_file:
-        with open(args.config_file) as cfg_fl:
-            config = json.load(cfg_fl)
-    else:
-        with open('logcryo.json') as cfg_fl:
-            config = json.load(cfg_fl)
-
-    if 'influxdb_url' in config and 'influxdb_token' in config and 'influxdb_org' in config:
-        config['influxdb_client'] = True
-    else:
-        config['influxdb_client'] = False
+    config = load_config(args.config_file)
+
     # -----------------------------------------------------------------------------
     # where the pressure gauge is located
     # -----------------------------------------------------------------------------
     host = config['presshost']
     port = config['pressport']
 
-    if len(sys.argv)==1:
-        sys.exit(1)
-
-    sock = None
+    tpg = None
     try:
-        # open socket
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect( (host, port) )
-        sock.setblocking(False)
+        # open socket (in --daemon mode the logging loop connects, and
+        # keeps retrying if the gauge can't be reached)
+        if not args.daemon:
+            tpg = TPGClient(host, port, config['presschans'])
 
         # send command to read pressure (the "read" parameter causes printing to stdout)
         if args.read:
-            read_pressure("read")
+            tpg.read_pressure("read")
 
         # send command to read pressure
         if args.log:
-            LOG_FILE = "pressure.log"
-            timestamp = datetime.now().strftime("%Y-%m-%dT%X")
-            # if the log file has grown over 1MB in size then rename it and start a new log file
-            # (assuming it exists, of course)
-            if os.path.exists(LOG_FILE):
-                if os.path.getsize(LOG_FILE) > 1024000:
-                    os.rename(LOG_FILE, LOG_FILE + "." + timestamp)
-            # open file for append
-            # read the pressure now (the "log" parameter is non-verbose)
-            pressure  = read_pressure("log")
+            signal.signal(signal.SIGTERM, signal_handler)
 
+            # connect once and reuse the connection for every sample
+            db_client = None
+            write_api = None
+            write = None
             if config['influxdb_client']:
+                # influxdb_client is slow to import, only load it when it is used
+                from influxdb_client import InfluxDBClient, WritePrecision
+                from influxdb_client.client.write_api import SYNCHRONOUS, WriteOptions
                 print("Connecting to InfluxDB...")
                 db_client = InfluxDBClient(url=config['influxdb_url'],
                                            token=config['influxdb_token'],
                                            org=config['influxdb_org'])
-                write_api = db_client.write_api(write_options=SYNCHRONOUS)
-                for ichan in config['presschans']:
-                    point = (
-                        Point("measurement")
-                        .tag("channel", ichan)
-                        .field("pressure", pressure[ichan])
-                    )
-                    print("Writing to InfluxDB... ", point)
-                    write_api.write(bucket=config['name'].upper(),
-                                    org=config['influxdb_org'],
-                                    record=point)
-
-            new_day = not os.path.exists(LOG_FILE)
-
-            pressfile = open(LOG_FILE, 'a')
-
-            if new_day:
-                hdr = 'datetime, ' + config['presshdrs']
-                pressfile.write(hdr + '\n')
-
-            list_format = '{:}, ' + config['pressfmts'] + '\n'
-
-            pressfile.write(list_format.format(*pressure))
-            pressfile.close()
+                if args.daemon:
+                    # batch in the background so a slow or unreachable database
+                    # doesn't hold up the next sample; failed writes are retried
+                    write_options = WriteOptions(batch_size=500,
+                                                 flush_interval=10_000,
+                                                 jitter_interval=2_000,
+                                                 retry_interval=5_000)
+                else:
+                    write_options = SYNCHRONOUS
+                write_api = db_client.write_api(write_options=write_options)
+                # every sample goes to the same place, bind it once
+                write = functools.partial(write_api.write,
+                                          bucket=config['name'].upper(),
+                                          org=config['influxdb_org'],
+                                          write_precision=WritePrecision.S)
+            pressfile = PressureLog(LOG_FILE, 'datetime, ' + config['presshdrs'] + '\n',
+                                    '{:}, ' + config['pressfmts'] + '\n',
+                                    flush_interval=LOG_FLUSH_INTERVAL if args.daemon else 0.)
+            try:
+                while True:
+                    try:
+                        if tpg is None:
+                            tpg = TPGClient(host, port, config['presschans'])
+                        log_pressure(tpg, write, pressfile)
+                        if args.daemon and tpg.lost_sync:
+                            # start the next sample on a new connection, so that
+                            # a late reply can't be read in place of a new one
+                            print("log: lost sync with the gauge, reconnecting")
+                            tpg.close()
+                            tpg = None
+                    except OSError as err:
+                        if not args.daemon:
+                            raise
+                        # lose this sample but keep logging, on a new connection
+                        print("log: %s, reconnecting" % err)
+                        if tpg is not None:
+                            tpg.close()
+                            tpg = None
+                    if not args.daemon:
+                        break
+                    # also when no sample was logged, so the lines before a
+                    # failure aren't left sitting in the buffer
+                    pressfile.flush()
+                    time.sleep(args.interval)
+            except KeyboardInterrupt:
+                # stop here, there may be no connection left for the commands below
+                sys.exit(0)
+            finally:
+                pressfile.close()
+                if db_client is not None:
+                    write_api.close()
+                    db_client.close()
 
         # turn power on|off
         if args.power:
-            cmd = 'SEN'
-            if args.power[0] == 'on':
-                for chan in range(1, config['pressnumchans']):
-                    if chan in config['presschans']:
-                        cmd += ',2'
-                    else:
-                        cmd += ',0'
-            elif args.power[0] == 'off':
-                for chan in range(1, config['pressnumchans']):
-                    if chan in config['presschans']:
-                        cmd += ',1'
-                    else:
-                        cmd += ',0'
+            cmd = b'SEN'
+            # one field per channel: 2 = on, 1 = off, 0 = no change
+            if args.power[0] in ('on', 'off'):
+                state = b'2' if args.power[0] == 'on' else b'1'
+                presschans = set(config['presschans'])
+                cmd = b','.join([cmd] + [state if chan in presschans else b'0'
+                                         for chan in range(1, config['pressnumchans'])])
             # or query the power status
             elif args.power[0] == '?':
                 pass
             else:
                 print("power: must specify on|off|?")
                 sys.exit(1)
-            send_command(cmd)
-            ret=get_reply()
+            tpg.send_command(cmd)
+            ret=tpg.get_reply()
             if ret==ACK:
-                sock.sendall(ENQ)
-                ret=get_reply()
+                ret=tpg.enquire()
                 answer = ret.decode( 'UTF-8' )
                 answer = answer.split(',')
                 for i, stat in enumerate(answer):
@@ -248,18 +475,18 @@ if __name__ == "__main__":
 
         # send arbitrary command, specified on command line
         if args.com:
-            send_command(args.com[0])
-            ret=get_reply()
+            tpg.send_command(args.com[0].encode( 'ascii' ))
+            ret=tpg.get_reply()
             if ret==ACK:
-                sock.sendall(ENQ)
+                ret=tpg.enquire()
             else:
                 print("com: didn't receive ACK")
-            ret=get_reply()
+                ret=tpg.get_reply()
             print(ret)
 
     except socket.error as sock_err:
         if sock_err.errno == errno.EHOSTUNREACH:
             print("error")
     finally:
-        if sock:
-            sock.close()
+        if tpg:
+            tpg.close()
@@ -4,17 +4,44 @@
     Uses .json config file with the same format as the logcryo.py routine.
 """
 import sys
-import os
+import csv
 import argparse
 import json
+import math
 import datetime
-from influxdb_client import InfluxDBClient, Point, WritePrecision
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from influxdb_client import InfluxDBClient, WritePrecision
 from influxdb_client.client.write_api import SYNCHRONOUS
 
+# number of points to send to InfluxDB in each write request
+BATCH_SIZE = 5000
+# number of batches written to InfluxDB concurrently
+WRITE_THREADS = 4
+
+# the old log files are time stamped in PST
+LOG_TZ = datetime.timezone(datetime.timedelta(hours=-8))
+
+def escape_tag(value):
+    """ Escape a tag value for InfluxDB line protocol """
+    return (value.replace('\\', '\\\\').replace(',', r'\,')
+                 .replace('=', r'\=').replace(' ', r'\ '))
+
+def record_prefix(channel, units, field):
+    """ Build a line protocol record up to the field value
+    an empty channel tag is left out, as it can't be sent
+    """
+    channel = escape_tag(channel)
+    if channel:
+        return "measurement,channel=%s,units=%s %s=" % (channel, units, field)
+    return "measurement,units=%s %s=" % (units, field)
+
+@functools.lru_cache(maxsize=4096)
 def parse_log_date(log_date):
     """ Parse dates from old log files
-    expected format: MM/DD/YY HH:MM:SS
-    transform to: YYYY-MM-DDTHH:MM:SS-08:00
+    expected format: MM/DD/YY HH:MM:SS (PST)
+    transform to: integer seconds since the epoch
 
     date_split = log_date.split()[0].split('/')
     time_str = log_date.split()[1]
@@ -28,7 +55,7 @@ def parse_log_date(log_date):
     try:
         dt_item = datetime.datetime.strptime(log_date, "%m/%d/%y %H:%M:%S")
         # Convert to the required format
-        return dt_item.strftime("%Y-%m-%dT%H:%M:%S-08:00")
+        return int(dt_item.replace(tzinfo=LOG_TZ).timestamp())
     except ValueError:
         print(f"Invalid date format: {log_date}")
         sys.exit(1)
@@ -45,10 +72,6 @@ if __name__ == "__main__":
                         type=str, help='log file to ingest')
     args = parser.parse_args()
 
-    if not os.path.exists(args.logfile):
-        print("log file {} does not exist".format(args.logfile))
-        sys.exit(1)
-
     if 'temp' in args.logfile:
         temp_log = True
         press_log = False
@@ -63,41 +86,106 @@ if __name__ == "__main__":
         print("logfile must contain 'press' or 'temp'")
         sys.exit(1)
 
-    with open(args.logfile, 'r') as logfile:
-        lines = logfile.readlines()
-        print("read {} lines".format(len(lines)))
+    # opening the file is the existence check
+    try:
+        logfile = open(args.logfile, 'r', newline='')
+    except FileNotFoundError:
+        print("log file {} does not exist".format(args.logfile))
+        sys.exit(1)
 
     with open(args.config_file, 'r') as confgf:
         config = json.load(confgf)
 
     print("Connecting to InfluxDB...")
+    # line protocol for a log is very repetitive and compresses well
     db_client = InfluxDBClient(url=config['influxdb_url'],
                                token=config['influxdb_token'],
-                               org=config['influxdb_org'])
+                               org=config['influxdb_org'],
+                               enable_gzip=True)
     write_api = db_client.write_api(write_options=SYNCHRONOUS)
 
-    hdrs = []
-    time_stamp = None
+    # parsing continues while earlier batches are being written; the
+    # number of batches in flight is capped so memory use stays bounded
+    executor = ThreadPoolExecutor(max_workers=WRITE_THREADS)
+    pending = deque()
+    bucket = config['name'].upper()
+    org = config['influxdb_org']
+
+    def submit_batch(records):
+        """ Queue a batch of records for writing """
+        if len(pending) >= 2 * WRITE_THREADS:
+            # wait for the oldest write, raising any error it hit
+            pending.popleft().result()
+        pending.append(executor.submit(write_api.write,
+                                       bucket=bucket,
+                                       org=org,
+                                       record=records,
+                                       write_precision=WritePrecision.S))
+
+    channel_prefixes = []
     point_count = 0
-    for line in lines:
-        if 'datetime' in line:
-            hdrs = line.split(',')
-        else:
-            data = line.split(',')
-            for ichan, datum in enumerate(data):
-                if ichan == 0:
-                    time_stamp = parse_log_date(datum)
-                else:
-                    point = (Point("measurement")
-                             .tag("channel", hdrs[ichan].strip())
-                             .tag("units", units)
-                             .time(time_stamp)
-                             .field(ptag, float(datum)))
-                    point_count += 1
-                    if point_count % 1000 == 0:
-                        print("Time Stamp: {}".format(time_stamp))
-                        print("Point Count: {}".format(point_count))
-                    write_api.write(bucket=config['name'].upper(),
-                                    org=config['influxdb_org'],
-                                    record=point,
-                                    write_precision=WritePrecision.S)
+    skip_count = 0
+    batch = []
+    try:
+        # read the log a line at a time rather than loading it all into memory
+        with logfile:
+            reader = csv.reader(logfile, skipinitialspace=True)
+            for data in reader:
+                if not data:
+                    continue
+                if 'datetime' in data[0]:
+                    # everything in a line protocol record up to the field value
+                    # is fixed per channel, so build it once from the header
+                    channel_prefixes = [record_prefix(hdr.strip(), units, ptag)
+                                        for hdr in data]
+                    continue
+
+                # a row can't be ingested without a header to name its channels,
+                # or if it was cut short, e.g. by the logger being killed mid-write
+                if not channel_prefixes:
+                    print("line {}: data before the header line, skipped".format(
+                        reader.line_num))
+                    skip_count += 1
+                    continue
+                if len(data) != len(channel_prefixes):
+                    print("line {}: {} columns, but the header has {}, skipped".format(
+                        reader.line_num, len(data), len(channel_prefixes)))
+                    skip_count += 1
+                    continue
+                try:
+                    values = [float(datum) for datum in data[1:]]
+                except ValueError as err:
+                    print("line {}: {}, skipped".format(reader.line_num, err))
+                    skip_count += 1
+                    continue
+
+                # the first column is the time stamp, shared by all channels in the row
+                time_stamp = " %d" % parse_log_date(data[0])
+                # build the records for every channel in the row at once,
+                # leaving out nan and inf, which InfluxDB won't accept
+                records = [prefix + repr(value) + time_stamp
+                           for prefix, value in zip(channel_prefixes[1:], values)
+                           if math.isfinite(value)]
+                batch.extend(records)
+                last_count = point_count
+                point_count += len(records)
+                if point_count // 1000 != last_count // 1000:
+                    print("Time Stamp: {}".format(data[0]))
+                    print("Point Count: {}".format(point_count))
+                if len(batch) >= BATCH_SIZE:
+                    submit_batch(batch)
+                    batch = []
+
+            line_count = reader.line_num
+
+        print("read {} lines, skipped {}".format(line_count, skip_count))
+
+    finally:
+        # write whatever is left over, even if the read stopped early
+        if batch:
+            submit_batch(batch)
+
+        # wait for all the writes to finish
+        while pending:
+            pending.popleft().result()
+        executor.shutdown()
@@ -51,59 +51,100 @@ HOW TO USE:
                 (e.g. 1:DWR, 3:CHM, 5:PRT)
     "pressfmts": <comma separated format strings for pressure channels (str)>
                 (e.g. {:.3f}, {:.4f} etc.)
+    "keep_connections": <optional, true to keep the controller connections
+                open between polls (bool, default false)>
+                (a terminal server that only accepts one connection at a
+                time is then unavailable to other clients, e.g. cryopress.py,
+                for as long as logcryo runs)
 }
 
 2. run this script with the .json file as an argument,
         i.e. "logcryo.py myfile.json" (can be run from command line or cron)
 """
 
-import traceback
 import argparse
-import json
+import atexit
+import functools
 import socket
-import select
 import sys
 import time
-from datetime import datetime,timedelta
+from datetime import datetime
 from random import uniform
 import os
 import glob
 import signal
 import threading
+from contextlib import contextmanager
 from pathlib import Path
-import numpy
 
-from influxdb_client import InfluxDBClient, Point
-from influxdb_client.client.write_api import SYNCHRONOUS
+# use orjson to read the config file if it's installed
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+from influxdb_client import InfluxDBClient, WritePrecision
+from influxdb_client.client.write_api import WriteOptions
 
 SRC_PATH = os.path.dirname(str(Path(__file__)))
 
-# random period retry boundaries --
-# for retry, wait a random period between RND0 and RND1 seconds
+# retry backoff boundaries --
+# for retry, wait RND0 seconds, doubling with each attempt up to RND1 seconds,
+# with +/-20% jitter
 RND0 = 1
 RND1 = 5
 MAX_RETRIES = 3
 
 SOCK_TIMEOUT=5
-MUTEX_TIMEOUT=10
+KEEPALIVE_IDLE=30
+KEEPALIVE_INTERVAL=10
+
+# open sockets, keyed by (host, port), and any buffered readers made from them;
+# kept between polls if keep_connections is set in the config
+connections = {}
+readers = {}
+
+# the last save_path that check_files found complete
+checked_path = None
+
+# open csv log files, keyed by log name, as (path, file), kept between polls
+log_files = {}
+
+# set by the signal handler to stop the program
+stop_event = threading.Event()
 
 mutex_temp = threading.Lock()
 mutex_press = threading.Lock()
 
+# InfluxDB client and write API, created on first use and kept for the
+# life of the program
+db_client = None
+write_api = None
+
+# config keys required by each logger, which is enabled by the presence of
+# its host key, and the defaults for its optional keys
+#
+REQUIRED_KEYS = { 'temphost':  ( 'tempport', 'tempchans', 'temphdrs', 'tempfmts' ),
+                  'presshost': ( 'pressport', 'pressnumchans', 'presschans',
+                                 'presshdrs', 'pressfmts' ) }
+DEFAULT_KEYS  = { 'temphost':  { 'temprate': 60 },
+                  'presshost': { 'pressrate': 60 } }
+
+# lower limits on required config values (for a list, on its length)
+#
+MIN_VALUES    = { 'pressnumchans': ( 1, "controller must have at least one channel" ),
+                  'presschans':    ( 1, "must have at least one active channel" ) }
+
 # Pfeiffer TPG control codes
 #
 ACK  = b'\x06\x0d\x0a'
 NAK  = b'\x15\x0d\x0a'
 ENQ  = b'\x05'
 
-# -----------------------------------------------------------------------------
-# @class  ProgramKilled
-# @brief  program killed exception
-# @param  none
-# @return none
-# -----------------------------------------------------------------------------
-class ProgramKilled( Exception ):
-    """ Class to handle program killed """
+# receive buffer for TPG replies (see read_tpg)
+#
+tpg_buf = bytearray(256)
+tpg_view = memoryview(tpg_buf)
 
 # -----------------------------------------------------------------------------
 # @fn     signal_handler
@@ -116,12 +157,15 @@ def signal_handler( signum, frame ):
     """ Signal handler """
     print(f"Signal handler called with signal {signum} received")
     _ = frame
-    raise ProgramKilled
+    stop_event.set()
 
 # -----------------------------------------------------------------------------
 # @class   Job
 # @brief   Class for handling threading jobs
 # @inherit threading.Thread
+#
+# interval is the time between runs of execute, in seconds (float). Runs are
+# kept on a fixed time.monotonic() grid, so a slow run doesn't delay the next.
 # -----------------------------------------------------------------------------
 class Job( threading.Thread ):
     """ Class to handle jobs """
@@ -141,9 +185,157 @@ class Job( threading.Thread ):
 
     def run( self ):
         """ Run thread """
-        self.execute( *self.args, **self.kwargs )
-        while not self.stopped.wait( self.interval.total_seconds() ):
+        # schedule each run from a fixed deadline so the time spent in
+        # execute doesn't push later runs back
+        deadline = time.monotonic()
+        while not self.stopped.is_set():
             self.execute( *self.args, **self.kwargs )
+            deadline += self.interval
+            wait = deadline - time.monotonic()
+            if wait < 0:
+                # overran by a whole interval or more, skip the missed runs
+                if wait < -self.interval:
+                    deadline = time.monotonic()
+                continue
+            if self.stopped.wait( wait ):
+                break
+
+# -----------------------------------------------------------------------------
+# @fn     try_lock
+# @brief  acquires a mutex without blocking, for use in a with statement
+# @param  mutex
+# @return yields True if the mutex was acquired, False if it was already held
+#
+# If it was acquired, the mutex is released however the with block is left.
+# -----------------------------------------------------------------------------
+@contextmanager
+def try_lock( mutex ):
+    """ Acquire mutex without blocking """
+    acquired = mutex.acquire( blocking=False )
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            mutex.release()
+
+# -----------------------------------------------------------------------------
+# @fn     load_config
+# @brief  reads the .json config file, for use as an argparse type
+# @param  config_file - config file name
+# @return configuration dictionary, with the file name added as 'config_file'
+#
+# Raises argparse.ArgumentTypeError if the file can't be read or parsed, so
+# that argparse reports the error and exits.
+# -----------------------------------------------------------------------------
+def load_config( config_file ):
+    """ Load config file """
+    try:
+        with open( config_file, 'rb' ) as cfg_fl:
+            config = json_loads( cfg_fl.read() )
+    except ( OSError, ValueError ) as exc:
+        raise argparse.ArgumentTypeError( "can't load %s: %s" % ( config_file, exc ) )
+    config['config_file'] = config_file
+    return config
+
+# -----------------------------------------------------------------------------
+# @fn     check_config
+# @brief  checks the config has every key needed by the enabled loggers
+# @param  config - configuration dictionary
+# @param  config_file - config file name, for messages
+# @return True if complete, False if not
+#
+# Every missing key or out of range value is reported, not just the first.
+# Defaults are filled in for the optional keys of the enabled loggers.
+# -----------------------------------------------------------------------------
+def check_config( config, config_file ):
+    """ Check config keys """
+    required = [ key for host, keys in REQUIRED_KEYS.items() if host in config
+                 for key in keys ]
+    missing = [ key for key in required if key not in config ]
+    for key in missing:
+        print( time.ctime(), "(main) ERROR: %s missing config key '%s'" % ( config_file, key ) )
+
+    bad = []
+    for key in required:
+        if key in MIN_VALUES and key in config:
+            minimum, message = MIN_VALUES[key]
+            value = config[key]
+            # a value of the wrong type (e.g. a quoted number) can't be compared
+            if not isinstance( value, ( list, int, float ) ):
+                print( time.ctime(), "(main) ERROR: '%s' must be a number or a list, not %s"
+                                     % ( key, type(value).__name__ ) )
+                bad.append( key )
+                continue
+            if ( len(value) if isinstance( value, list ) else value ) < minimum:
+                print( time.ctime(), "(main) ERROR: '%s' %s" % ( key, message ) )
+                bad.append( key )
+
+    for host, defaults in DEFAULT_KEYS.items():
+        if host in config:
+            for key, value in defaults.items():
+                config.setdefault( key, value )
+
+    return not missing and not bad
+
+# -----------------------------------------------------------------------------
+# @fn     csv_field
+# @brief  splits a comma separated config field into a list
+# @param  config - configuration dictionary
+# @param  key - config key
+# @return list of the non-empty entries (empty list if the field is blank)
+# -----------------------------------------------------------------------------
+def csv_field( config, key ):
+    """ Split comma separated config field """
+    return [ field for field in config[key].split(',') if field ]
+
+# -----------------------------------------------------------------------------
+# @fn     get_write_api
+# @brief  returns the InfluxDB write API, connecting on first use
+# @param  **hconfig - configuration dictionary
+# @return InfluxDB write API
+#
+# Points are batched and written in the background by the client, and
+# each request is gzip compressed.
+# -----------------------------------------------------------------------------
+def get_write_api(**hconfig):
+    """ Get InfluxDB write API """
+    global db_client, write_api
+    if write_api is None:
+        print( time.ctime(), "Connecting to InfluxDB..." )
+        db_client = InfluxDBClient(url=hconfig['influxdb_url'],
+                                   token=hconfig['influxdb_token'],
+                                   org=hconfig['influxdb_org'],
+                                   enable_gzip=True)
+        write_api = db_client.write_api(write_options=WriteOptions(batch_size=500,
+                                                                   flush_interval=1000,
+                                                                   jitter_interval=200))
+        atexit.register(close_influxdb)
+    return write_api
+
+# -----------------------------------------------------------------------------
+# @fn     close_influxdb
+# @brief  flushes any pending points and closes the InfluxDB client
+# -----------------------------------------------------------------------------
+def close_influxdb():
+    """ Close InfluxDB client """
+    if write_api is not None:
+        write_api.close()
+        db_client.close()
+
+# -----------------------------------------------------------------------------
+# @fn     resolve
+# @brief  looks up the addresses for host:port
+# @param  host
+# @param  port
+# @return tuple of getaddrinfo results
+#
+# The controllers' addresses don't change while running, so each lookup is
+# only done once. Failed lookups raise socket.gaierror and are not cached.
+# -----------------------------------------------------------------------------
+@functools.lru_cache(maxsize=16)
+def resolve(host, port):
+    """ Resolve host address """
+    return tuple( socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_STREAM) )
 
 # -----------------------------------------------------------------------------
 # @fn     open_socket
@@ -156,8 +348,13 @@ class Job( threading.Thread ):
 def open_socket(host, port):
     """ Open socket """
     sock = None
-    for res in socket.getaddrinfo(host, port, socket.AF_INET,
-                                  socket.SOCK_STREAM):
+    try:
+        addrs = resolve(host, port)
+    except socket.gaierror as msg:
+        print( time.ctime(), '(open_socket) lookup of %s failed: %s'
+               % (host, msg), file=sys.stderr )
+        addrs = ()
+    for res in addrs:
         af_type, socktype, proto, _, sock_addr =res
         try:
             sock = socket.socket(af_type, socktype, proto)
@@ -168,9 +365,8 @@ def open_socket(host, port):
         try:
             sock.connect(sock_addr)
         except socket.error as msg:
-            tb_str = traceback.format_exception(etype=type(msg), value=msg,
-                                                tb=msg.__traceback__)
-            print("".join(tb_str))
+            print( time.ctime(), '(open_socket) connect to %s:%s failed: %s'
+                   % (sock_addr[0], sock_addr[1], msg), file=sys.stderr )
             sock.close()
             sock = None
             continue
@@ -183,25 +379,160 @@ def open_socket(host, port):
     sock.settimeout(SOCK_TIMEOUT)
     return sock
 
+# -----------------------------------------------------------------------------
+# @fn     get_socket
+# @brief  returns the cached socket for host:port, connecting if needed
+# @param  host
+# @param  port
+# @return On success returns a handle to that socket.
+#         On error, returns False
+#
+# The connection is closed at the end of each poll by release_socket, unless
+# keep_connections is set in the config. Then it is kept open between polls
+# with TCP keepalive enabled, and only closed (by drop_socket) when an error
+# occurs on it.
+# -----------------------------------------------------------------------------
+def get_socket(host, port):
+    """ Get cached socket """
+    sock = connections.get( (host, port) )
+    if sock:
+        return sock
+
+    sock = open_socket(host, port)
+    if not sock:
+        return False
+
+    # commands are a few bytes each, send them without waiting
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # keepalive tuning options are not available on every platform
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_IDLE)
+    if hasattr(socket, 'TCP_KEEPINTVL'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, KEEPALIVE_INTERVAL)
+
+    connections[ (host, port) ] = sock
+    return sock
+
+# -----------------------------------------------------------------------------
+# @fn     get_reader
+# @brief  returns a buffered reader for the cached socket for host:port
+# @param  host
+# @param  port
+# @return file object in binary mode
+#
+# The reader is kept with the socket so that it is only made once.
+# -----------------------------------------------------------------------------
+def get_reader(host, port):
+    """ Get buffered reader for cached socket """
+    rfile = readers.get( (host, port) )
+    if rfile is None:
+        rfile = connections[ (host, port) ].makefile( 'rb', buffering=4096 )
+        readers[ (host, port) ] = rfile
+    return rfile
+
+# -----------------------------------------------------------------------------
+# @fn     drop_socket
+# @brief  closes the cached socket for host:port, if any
+# @param  host
+# @param  port
+# @return none
+# -----------------------------------------------------------------------------
+def drop_socket(host, port):
+    """ Close cached socket """
+    rfile = readers.pop( (host, port), None )
+    if rfile:
+        rfile.close()
+    sock = connections.pop( (host, port), None )
+    if sock:
+        sock.close()
+
+# -----------------------------------------------------------------------------
+# @fn     release_socket
+# @brief  closes the cached socket for host:port at the end of a poll,
+#         unless keep_connections is set in the config
+# @param  host
+# @param  port
+# @param  **hconfig - configuration dictionary
+# @return none
+#
+# The Perle terminal servers only accept one connection at a time, so by
+# default the connection is given up between polls for other clients.
+# -----------------------------------------------------------------------------
+def release_socket(host, port, **hconfig):
+    """ Release socket after a poll """
+    if not hconfig.get( 'keep_connections' ):
+        drop_socket(host, port)
+
+# -----------------------------------------------------------------------------
+# @fn     close_sockets
+# @brief  closes all cached sockets
+# -----------------------------------------------------------------------------
+def close_sockets():
+    """ Close all cached sockets """
+    for host, port in list(connections):
+        drop_socket(host, port)
+
+atexit.register(close_sockets)
+
 # -----------------------------------------------------------------------------
 # @fn     read_tpg
 # @brief  read TPG controller
 # @param  sock
 # @return TPG response
+#
+# Replies are received into the one module-level buffer, tpg_buf, which is
+# safe because every caller holds mutex_press.
 # -----------------------------------------------------------------------------
 def read_tpg( sock ):
     """ Read TPG controller """
+    # a reply may arrive split over several packets, so collect it all
+    nbytes = 0
     while True:
-        ready = select.select( [sock], [], [], 3 )
-        if ready[0]:
-            ret = sock.recv(1024)
-        else:
-            print( time.ctime(), "(read_tpg) select timeout")
-            ret = None
-            break
-        if b'\n' in ret:
-            break
-    return ret
+        # the socket timeout (SOCK_TIMEOUT) bounds the wait for a reply
+        try:
+            nrecv = sock.recv_into( tpg_view[nbytes:] )
+        except socket.timeout:
+            print( time.ctime(), "(read_tpg) timeout")
+            return None
+        # connection closed by the far end
+        if not nrecv:
+            print( time.ctime(), "(read_tpg) connection closed")
+            return None
+        found = tpg_buf.find( b'\n', nbytes, nbytes + nrecv ) >= 0
+        nbytes += nrecv
+        if found:
+            return tpg_view[:nbytes].tobytes()
+        if nbytes == len( tpg_buf ):
+            print( time.ctime(), "(read_tpg) reply too long")
+            return None
+
+# -----------------------------------------------------------------------------
+# @fn     query_tpg
+# @brief  sends a command to the TPG controller and reads back its reply
+# @param  sock
+# @param  cmd - command mnemonic, terminated with CR LF (bytes)
+# @return reply as a list of comma separated fields
+#
+# Raises ConnectionError if the command is not acknowledged or the reply
+# does not arrive.
+# -----------------------------------------------------------------------------
+def query_tpg( sock, cmd ):
+    """ Send command to TPG controller and read reply """
+    sock.sendall( cmd )
+
+    # first response is ACK, then ENQ requests the reply
+    ret = read_tpg( sock )
+    if ret != ACK:
+        raise ConnectionError( "didn't receive ACK, received: %s" % ret )
+    sock.sendall( ENQ )
+
+    # second response is the reply
+    ret = read_tpg( sock )
+    if ret is None:
+        raise ConnectionError( "no reply" )
+    return ret.decode( 'UTF-8' ).split(',')
 
 # -----------------------------------------------------------------------------
 # @fn     sen_onoff
@@ -240,63 +571,40 @@ def sen_onoff(chan, onoff, **hconfig):
         else:
             onoff_dict[ichan] = 0
     # don't let another thread run this at the same time
-    if mutex_press.locked():
-        print( time.ctime(), "(sen_onoff) ERROR: mutex locked" )
-        return 'BSY'
+    with try_lock( mutex_press ) as acquired:
+        if not acquired:
+            print( time.ctime(), "(sen_onoff) ERROR: mutex locked" )
+            return 'BSY'
 
-    # acquire mutex lock and open socket
-    mutex_press.acquire( blocking=True, timeout=MUTEX_TIMEOUT )
-
-    sock = open_socket(hconfig['presshost'], hconfig['pressport'])
+        # get the (possibly already open) socket
+        sock = get_socket(hconfig['presshost'], hconfig['pressport'])
 
-    if not sock:
-        mutex_press.release()
-        print( time.ctime(), "(sen_onoff) ERROR creating socket" )
-        return 'ERR'
+        if not sock:
+            print( time.ctime(), "(sen_onoff) ERROR creating socket" )
+            return 'ERR'
 
-    # create an empty list, then start adding things to it (in order) for the return value
-    retlist= [datetime.now().strftime("%D %T")]
+        # create an empty list, then start adding things to it (in order) for the return value
+        retlist= [datetime.now().strftime("%D %T")]
 
-    # first the date is added, then each channel requested in the order requested
+        # first the date is added, then each channel requested in the order requested
 
-    try:
-        # send command to set state of sensors
-        cmd = b'SEN'
-        for ichan in range(1, num_chans + 1):
-            cmd += b',%d' % onoff_dict[ichan]
-        cmd += b'\r\n'
+        try:
+            # send command to set state of sensors
+            cmd = b','.join( [b'SEN'] + [ b'%d' % onoff_dict[ichan]
+                                          for ichan in range(1, num_chans + 1) ] ) + b'\r\n'
 
-        print(cmd)
-        sock.sendall( cmd )
+            print(cmd)
 
-        # first response is ACK
-        ret = read_tpg( sock )
+            # reply is the status
+            for stat in query_tpg( sock, cmd ):
+                retlist.append( int( stat ))
 
-        if ret == ACK:
-            sock.sendall( ENQ )
-        else:
-            print( time.ctime(), "(sen_onoff) ERROR: didn't receive ACK" )
-            print("received: ", ret)
-            sock.close()
-            mutex_press.release()
+        except Exception as ex:
+            print( time.ctime(), "(sen_onoff) exception: ", str(ex) )
+            drop_socket(hconfig['presshost'], hconfig['pressport'])
             return 'ERR'
 
-        # second response is the status
-        ret = read_tpg( sock )
-        ans = ret.decode( 'UTF-8' )
-        ans = ans.split(',')
-
-        for stat in ans:
-            retlist.append( int( stat ))
-
-    except Exception as ex:
-        print( time.ctime(), "(sen_onoff) exception: ", str(ex) )
-        sock.close()
-        mutex_press.release()
-        return 'ERR'
-
-    sock.close()
-    mutex_press.release()
+        release_socket(hconfig['presshost'], hconfig['pressport'], **hconfig)
 
     return retlist
 
@@ -317,54 +625,34 @@ def sen_stat(**hconfig):
     """
 
     # don't let another thread run this at the same time
-    if mutex_press.locked():
-        print( time.ctime(), "(sen_stat) ERROR: mutex locked" )
-        return 'BSY'
-
-    # acquire mutex lock and open socket
-    mutex_press.acquire( blocking=True, timeout=MUTEX_TIMEOUT )
+    with try_lock( mutex_press ) as acquired:
+        if not acquired:
+            print( time.ctime(), "(sen_stat) ERROR: mutex locked" )
+            return 'BSY'
 
-    sock = open_socket(hconfig['presshost'], hconfig['pressport'])
-
-    if not sock:
-        mutex_press.release()
-        print( time.ctime(), "(sen_stat) ERROR creating socket" )
-        return 'ERR'
+        # get the (possibly already open) socket
+        sock = get_socket(hconfig['presshost'], hconfig['pressport'])
 
-    # create an empty list, then start adding things to it (in order) for the return value
-    retlist= [datetime.now().strftime("%D %T")]
+        if not sock:
+            print( time.ctime(), "(sen_stat) ERROR creating socket" )
+            return 'ERR'
 
-    # first the date is added, then each channel requested in the order requested
+        # create an empty list, then start adding things to it (in order) for the return value
+        retlist= [datetime.now().strftime("%D %T")]
 
-    try:
-        # send command to get sensor states
-        sock.sendall( b'SEN\r\n' )
+        # first the date is added, then each channel requested in the order requested
 
-        # first response is ACK
-        ret = read_tpg( sock )
+        try:
+            # send command to get sensor states, reply is the status
+            for stat in query_tpg( sock, b'SEN\r\n' ):
+                retlist.append( int(stat) )
 
-        if ret == ACK:
-            sock.sendall( ENQ )
-        else:
-            print( time.ctime(), "(sen_stat) ERROR: didn't receive ACK" )
+        except Exception as ex:
+            print( time.ctime(), "(sen_stat) exception: ", str(ex) )
+            drop_socket(hconfig['presshost'], hconfig['pressport'])
             return 'ERR'
 
-        # second response is the status
-        ret = read_tpg( sock )
-        ans = ret.decode( 'UTF-8' )
-        ans = ans.split(',')
-
-        for stat in ans:
-            retlist.append( int(stat) )
-
-    except Exception as ex:
-        print( time.ctime(), "(sen_stat) exception: ", str(ex) )
-        sock.close()
-        mutex_press.release()
-        return 'ERR'
-
-    sock.close()
-    mutex_press.release()
+        release_socket(hconfig['presshost'], hconfig['pressport'], **hconfig)
 
     return retlist
 
@@ -378,71 +666,52 @@ def get_tpg(**hconfig):
     """ Get TPG reading """
 
     # don't let another thread run this at the same time
-    if mutex_press.locked():
-        print( time.ctime(), "(get_tpg) ERROR: mutex locked" )
-        return 'BSY'
+    with try_lock( mutex_press ) as acquired:
+        if not acquired:
+            print( time.ctime(), "(get_tpg) ERROR: mutex locked" )
+            return 'BSY'
 
-    # acquire mutex lock and open socket
-    mutex_press.acquire( blocking=True, timeout=MUTEX_TIMEOUT )
-
-    sock = open_socket(hconfig['presshost'], hconfig['pressport'])
-
-    if not sock:
-        mutex_press.release()
-        print( time.ctime(), "(get_tpg) ERROR creating socket" )
-        return 'ERR'
+        # get the (possibly already open) socket
+        sock = get_socket(hconfig['presshost'], hconfig['pressport'])
 
-    # create an empty list, then start adding things to it (in order) for the return value
-    retlist= [datetime.now().strftime("%D %T")]
-
-    # first the date is added, then each channel requested in the order requested
+        if not sock:
+            print( time.ctime(), "(get_tpg) ERROR creating socket" )
+            return 'ERR'
 
-    try:
-        for ichan in hconfig['presschans']:
-            # send command to read pressure
-            sock.sendall( b'PR%d\r\n' % ichan )
+        # create an empty list, then start adding things to it (in order) for the return value
+        retlist= [datetime.now().strftime("%D %T")]
 
-            # first response is ACK
-            ret = read_tpg( sock )
+        # first the date is added, then each channel requested in the order requested
 
-            if ret == ACK:
-                sock.sendall( ENQ )
-            else:
-                print( time.ctime(), "(get_tpg) ERROR: didn't receive ACK" )
+        try:
+            # send one command to read the pressure on all gauges,
+            # reply is status,pressure for every gauge on the controller
+            ans = query_tpg( sock, b'PRX\r\n' )
 
-            # second response is the pressure
-            ret = read_tpg( sock )
-            ans = ret.decode( 'UTF-8' )
-            ans = ans.split(',')
+            # InfluxDB points are built directly as line protocol, timestamped in seconds
+            now = int( time.time() )
+            points = []
+            for ichan in hconfig['presschans']:
+                retpress = float( ans[2*ichan-1] ) * 1000.  # convert to mTorr
+                retlist.append( retpress )
 
-            retpress = float( ans[1] ) * 1000.  # convert to mTorr
-            retlist.append( retpress )
+                points.append( "measurement,channel=pressure%d,units=mTorr pressure=%r %d"
+                               % ( ichan, retpress, now ) )
 
+            # all channels go to InfluxDB in one write
             if hconfig['influxdb_client']:
-                print("Connecting to InfluxDB...")
-                db_client = InfluxDBClient(url=hconfig['influxdb_url'],
-                                           token=hconfig['influxdb_token'],
-                                           org=hconfig['influxdb_org'])
-                write_api = db_client.write_api(write_options=SYNCHRONOUS)
-                point = (
-                    Point("measurement")
-                    .tag("channel", "pressure{}".format(ichan))
-                    .tag( "units", "mTorr")
-                    .field("pressure", retpress)
-                )
-                print("Writing to InfluxDB... ", point)
-                write_api.write(bucket=hconfig['name'].upper(),
-                                org=hconfig['influxdb_org'],
-                                record=point)
+                print("Writing to InfluxDB... ", points)
+                get_write_api(**hconfig).write(bucket=hconfig['name'].upper(),
+                                               org=hconfig['influxdb_org'],
+                                               record=points,
+                                               write_precision=WritePrecision.S)
 
-    except Exception as ex:
-        print( time.ctime(), "(get_tpg) exception: ", str(ex) )
-        sock.close()
-        mutex_press.release()
-        return 'ERR'
+        except Exception as ex:
+            print( time.ctime(), "(get_tpg) exception: ", str(ex) )
+            drop_socket(hconfig['presshost'], hconfig['pressport'])
+            return 'ERR'
 
-    sock.close()
-    mutex_press.release()
+        release_socket(hconfig['presshost'], hconfig['pressport'], **hconfig)
 
     return retlist
 
@@ -456,85 +725,63 @@ def get_temps(**hconfig):
     """ Get temperatures """
 
     # don't let another thread run this at the same time
-    if mutex_temp.locked():
-        print( time.ctime(), "(get_temps) ERROR: mutex locked" )
-        return 'BSY'
+    with try_lock( mutex_temp ) as acquired:
+        if not acquired:
+            print( time.ctime(), "(get_temps) ERROR: mutex locked" )
+            return 'BSY'
 
-    # acquire mutex lock and open socket
-    mutex_temp.acquire( blocking=True, timeout=MUTEX_TIMEOUT )
+        # get the (possibly already open) socket
+        sock = get_socket(hconfig['temphost'], hconfig['tempport'])
 
-    sock = open_socket(hconfig['temphost'], hconfig['tempport'])
-
-    if not sock:
-        mutex_temp.release()
-        print( time.ctime(), "(get_temps) ERROR creating socket" )
-        return 'ERR'
+        if not sock:
+            print( time.ctime(), "(get_temps) ERROR creating socket" )
+            return 'ERR'
 
-    # create an empty list, then start adding things to it (in order) for the return value
-    retlist= [datetime.now().strftime("%D %T")]
+        rfile = get_reader(hconfig['temphost'], hconfig['tempport'])
 
-    # first the date is added, then each channel requested in the order requested
+        # create an empty list, then start adding things to it (in order) for the return value
+        retlist= [datetime.now().strftime("%D %T")]
 
-    # add the temperature and heaters into one list
-    chanlist = hconfig['tempchans'].split(',')
+        # first the date is added, then each channel requested in the order requested
 
-    # read all requested channels
-    for chit in chanlist:
         try:
-            # if the channel ch is not a digit ('A', 'C2', etc.) then it's a temperature channel
-            if not chit.isdigit():
-                message = "KRDG? %s\n" % chit
-            # otherwise if it's a digit ('1', '2') then it's a heater
+            # send the compound query for all requested channels (built by main),
+            # the reply is one line with the answers separated by semicolons
+            sock.sendall( hconfig['tempquery'] )
+            # the terminal server's busy message (below) may not end in a
+            # newline, so look for it in the first bytes received rather than
+            # waiting for a whole line and timing out
+            if b'Selected hunt group busy' in rfile.peek():
+                line = rfile.read1()
             else:
-                message = "HTR? %s\n" % chit
-
-            # send the appropriate message
-            sock.sendall( message.encode( 'UTF-8' ) )
-
-            # read bytes up until we get endchar
-            endchar='\n'
-            datl=[]
-            temp=''
-            while endchar not in temp:
-                # recv up to 1k but it's always going to be delivered in multiple, smaller chunks
-                temp = sock.recv(1024).decode('UTF-8')
-
-                # the Perle terminal servers can only accept one connection at a time,
-                # and will return this if you try to exceed that
-                if 'Selected hunt group busy' in temp:
-                    print( time.ctime(), "(get_temps) multiple simultaneous connections forbidden" )
-                    sock.close()
-                    mutex_temp.release()
-                    return 'BSY'
-
-                # the end of the message -- get out
-                if endchar in temp:
-                    datl.append(temp[:temp.find(endchar)])
-                    break
-
-                # if not the end of message then append what was just read into the dat list
-                datl.append(temp)
-
-                if len(datl)>1:
-                    last=datl[-2]+datl[-1]
-                    if endchar in last:
-                        datl[-2]=last[:last.find(endchar)]
-                        datl.pop()
-                        break
-
-            # done receiving data so join all the dat[] list together, convert to float,
-            # and append it to the return value list
-            retlist.append( float(''.join(datl)) )
+                line = rfile.readline()
+
+            # connection closed by the far end
+            if not line:
+                raise ConnectionResetError("connection closed")
+
+            # the Perle terminal servers can only accept one connection at a time,
+            # and will return this if you try to exceed that
+            if b'Selected hunt group busy' in line:
+                print( time.ctime(), "(get_temps) multiple simultaneous connections forbidden" )
+                drop_socket(hconfig['temphost'], hconfig['tempport'])
+                return 'BSY'
+
+            # convert each answer to float and append them to the return value list
+            answers = line.split( b';' )
+            if len( answers ) != len( hconfig['tempcmds'] ):
+                raise ValueError( "expected %d answers, received: %s"
+                                  % ( len( hconfig['tempcmds'] ), line ) )
+            retlist.extend( [ float( answer ) for answer in answers ] )
 
         except Exception as ex:
+            # any reply still in flight would be read by the next poll, so drop
+            # the connection and start clean
             print( time.ctime(), "(get_temps) exception: ", str(ex) )
-            retlist.append( numpy.nan )
-            sock.close()
-            mutex_temp.release()
+            drop_socket(hconfig['temphost'], hconfig['tempport'])
             return 'ERR'
 
-    sock.close()
-    mutex_temp.release()
+        release_socket(hconfig['temphost'], hconfig['tempport'], **hconfig)
 
     return retlist
 
@@ -562,14 +809,13 @@ def get_press(**hconfig):
     time.sleep(0.2)
 
     while bytesread<13:
-        ready=select.select([sock],[],[],3)
-        if ready[0]:
+        try:
             temp = sock.recv(1024).decode( 'UTF-8' )
-            reply=reply+temp
-            bytesread += len(temp)
-        else:
-            print( time.ctime(), "(get_press) select timeout" )
+        except socket.timeout:
+            print( time.ctime(), "(get_press) timeout" )
             return 'ERR'
+        reply=reply+temp
+        bytesread += len(temp)
 
     pressure = float(reply[3:12])
     print( time.ctime(), "(get_press) pressure=", pressure )
@@ -590,14 +836,17 @@ def get_press(**hconfig):
 # -----------------------------------------------------------------------------
 def check_files( save_path, **fargs ):
     """ Check if files in save_path exist """
+    global checked_path
+
+    # save_path includes the date, so this only needs doing once a day
+    if save_path == checked_path:
+        return True
 
     # check that all the needed support files are in place
     #
     try:
-        # create the log files (and directories, if needed)
-        if not os.path.exists(save_path):
-            print( time.ctime(), "(check_files) creating path %s" % save_path )
-            os.makedirs(save_path)
+        # create the log directories, if needed
+        os.makedirs(save_path, exist_ok=True)
 
         # index.html file for this particular date displays the graph of today's data
         html = save_path + "/index.html"
@@ -606,7 +855,6 @@ def check_files( save_path, **fargs ):
         # and replacing "PROJECT" with the actual project name (in upper case)
         if not os.path.exists(html):
             print( time.ctime(), "(check_files) creating %s" % html )
-            index_html_outfile = open( html, 'a' )
             # the template is htmsrc
             if SRC_PATH:
                 htmsrc = SRC_PATH + "/index-html-src.in"
@@ -615,27 +863,19 @@ def check_files( save_path, **fargs ):
             if not os.path.exists( htmsrc ):
                 print( time.ctime(), "(check_files) ERROR: missing htmsrc file: ", htmsrc )
                 return False
-            # a list of things to find and replace (project name and heater labels)
-            findlist = [ "PROJECT", "HEATERLABELONE", "HEATERLABELTWO" ]
-            # the list of things to replace them with
-            replacelist = [ fargs['name'].upper() ]
-            replacelist += [ fargs['heater_header'][0] ]
-            replacelist += [ fargs['heater_header'][1] ]
-            with open( htmsrc ) as inputfile:
-                # read a line at a time from "htmsrc" file
-                for line in inputfile:
-                    # perform any needed replacements
-                    for flist, rlist in zip( findlist, replacelist):
-                        line = line.replace( flist, rlist )
-                    # write back the line (with any replacements) to the index.html file
-                    index_html_outfile.write( line )
-            inputfile.close()
-            index_html_outfile.close()
+            # replace the project name and heater labels, and write the result
+            # to the index.html file
+            template = Path( htmsrc ).read_text()
+            Path( html ).write_text( template
+                                     .replace( "PROJECT", fargs['name'].upper() )
+                                     .replace( "HEATERLABELONE", fargs['heater_header'][0] )
+                                     .replace( "HEATERLABELTWO", fargs['heater_header'][1] ) )
 
     except Exception as ex:
         print( time.ctime(), "(check_files) exception:", str(ex) )
         return False
 
+    checked_path = save_path
     return True
 
 
@@ -675,6 +915,55 @@ def make_index(index_path, **fargs):
             lastmonth = int(mm)
         ihfile.write("<a href=\"%s\">%s-%s-%s</a><br>\n" % ( yeardate, curr_year, mm, dd ) )
 
+# -----------------------------------------------------------------------------
+# @fn     get_log_file
+# @brief  returns the open csv log file for name, opening it if needed
+# @param  name - log name ('press' or 'temps')
+# @param  logfile - path to today's log file
+# @return tuple of (file, new_day), where new_day is True if the file was
+#         just created and needs a header
+#
+# The file stays open between polls and is only reopened when the path
+# changes, i.e. when the date rolls over.
+# -----------------------------------------------------------------------------
+def get_log_file( name, logfile ):
+    """ Get open log file """
+    cached = log_files.get( name )
+    if cached and cached[0] == logfile:
+        return cached[1], False
+
+    close_log_file( name )
+
+    # new day?
+    new_day = not os.path.exists(logfile)
+
+    logfh = open( logfile, 'a', buffering=8192 )
+    log_files[ name ] = ( logfile, logfh )
+    return logfh, new_day
+
+# -----------------------------------------------------------------------------
+# @fn     close_log_file
+# @brief  closes the open csv log file for name, if any
+# @param  name - log name ('press' or 'temps')
+# @return none
+# -----------------------------------------------------------------------------
+def close_log_file( name ):
+    """ Close open log file """
+    cached = log_files.pop( name, None )
+    if cached:
+        cached[1].close()
+
+# -----------------------------------------------------------------------------
+# @fn     close_log_files
+# @brief  closes all open csv log files
+# -----------------------------------------------------------------------------
+def close_log_files():
+    """ Close all open log files """
+    for name in list(log_files):
+        close_log_file( name )
+
+atexit.register(close_log_files)
+
 # -----------------------------------------------------------------------------
 # @fn     logpress
 # @brief  workhorse function, calls get_tpg and does the logging
@@ -709,7 +998,6 @@ def logpress(**pconfig):
         tpgpress = get_tpg( **pconfig )
         print(tpgpress)
 
-        tpgpressfile = None
         if tpgpress is None:
             # no attempt to log nor try again on error
             break
@@ -719,37 +1007,32 @@ def logpress(**pconfig):
         if tpgpress != 'BSY':
             try:
                 if logfile:
-                    # new day?
-                    new_day = not os.path.exists(logfile)
-
-                    tpgpressfile = open(logfile, 'a')
+                    tpgpressfile, new_day = get_log_file( 'press', logfile )
 
                     if new_day:
-                        hdr = 'datetime, ' + pconfig['presshdrs']
-                        tpgpressfile.write( hdr + '\n' )
+                        tpgpressfile.write( pconfig['pressheader'] )
                         if not pconfig['logtemps']:
                             make_index(index_path, **pconfig)
 
-                    list_format = '{:}, ' + pconfig['pressfmts'] + '\n'
-
-                    tpgpressfile.write( list_format.format(*tpgpress) )
-                    tpgpressfile.close()
+                    tpgpressfile.write( pconfig['pressline'](*tpgpress) )
+                    tpgpressfile.flush()
                     break
 
             except Exception as ex:
                 print( time.ctime(), "(logpress) exception:", str(ex) )
-                if tpgpressfile is not None:
-                    tpgpressfile.close()
+                close_log_file( 'press' )
                 return
 
-        # wait some random period between RND0 and RND1 sec before trying again
-        retrytime = uniform(RND0,RND1)
+        # back off exponentially from RND0 up to RND1 sec before trying again
+        retrytime = min( RND1, RND0 * 2**retry_count ) * uniform( 0.8, 1.2 )
         retry_count += 1
         if retry_count < MAX_RETRIES:
             print( time.ctime(),
                    "(logpress) attempt # %d failed, trying again "
                    "in %.2f seconds" % (retry_count, retrytime) )
-            time.sleep(retrytime)
+            # a shutdown request ends the wait early
+            if stop_event.wait( retrytime ):
+                return
 
         if ( retry_count >= MAX_RETRIES ) and ( tpgpress == 'BSY' ):
             print( time.ctime(),
@@ -791,7 +1074,6 @@ def logtemp(**tconfig):
         lkstemps = get_temps(**tconfig)
         print( time.ctime(), "(logtemp) lkstemps=", lkstemps )
 
-        lkstempfile = None
         if lkstemps is None:
             # no attempt to log nor try again on error
             break
@@ -800,35 +1082,31 @@ def logtemp(**tconfig):
             break
         if lkstemps != 'BSY':
             try:
-                new_day = not os.path.exists(logfile)
-
-                lkstempfile = open(logfile, 'a')
+                lkstempfile, new_day = get_log_file( 'temps', logfile )
 
                 if new_day:
-                    hdr = 'datetime, ' + tconfig['temphdrs']
-                    lkstempfile.write(hdr + '\n')
+                    lkstempfile.write( tconfig['tempheader'] )
                     make_index(index_path, **tconfig)
 
-                list_format = '{:}, ' + tconfig['tempfmts'] + '\n'
-
-                lkstempfile.write( list_format.format(*lkstemps) )
-                lkstempfile.close()
+                lkstempfile.write( tconfig['templine'](*lkstemps) )
+                lkstempfile.flush()
                 break
 
             except Exception as ex:
                 print( time.ctime(), "(logtemp) exception:", str(ex) )
-                if lkstempfile is not None:
-                    lkstempfile.close()
+                close_log_file( 'temps' )
                 return
 
-        # wait some random period between RND0 and RND1 sec before trying again
-        retrytime = uniform(RND0,RND1)
+        # back off exponentially from RND0 up to RND1 sec before trying again
+        retrytime = min( RND1, RND0 * 2**retry_count ) * uniform( 0.8, 1.2 )
         retry_count += 1
         if retry_count < MAX_RETRIES:
             print( time.ctime(),
                    "(logtemp) attempt # %d failed, "
                    "trying again in %.2f seconds" % (retry_count, retrytime) )
-            time.sleep(retrytime)
+            # a shutdown request ends the wait early
+            if stop_event.wait( retrytime ):
+                return
 
         if ( retry_count == MAX_RETRIES ) and ( lkstemps == 'BSY' ):
             print( time.ctime(),
@@ -853,20 +1131,21 @@ if __name__ == "__main__":
     signal.signal( signal.SIGINT, signal_handler )
 
     parser=argparse.ArgumentParser(description='logger')
-    parser.add_argument( 'config_file', help='.json file required to configure the logger' )
+    parser.add_argument( 'config', metavar='config_file', type=load_config,
+                         help='.json file required to configure the logger' )
     args = parser.parse_args()
 
-    with open(args.config_file) as cfg_fl:
-        config = json.load(cfg_fl)
+    config = args.config
 
     # need to have a project name and it can't be empty
     #
     if 'name' in config:
         if not config['name']:
-            print( time.ctime(), "(main) ERROR: 'name' in %s cannot be empty!" % args.config_file )
+            print( time.ctime(), "(main) ERROR: 'name' in %s cannot be empty!"
+                                 % config['config_file'] )
             sys.exit(1)
     else:
-        print( time.ctime(), "(main) ERROR: %s missing config key 'name'" % args.config_file )
+        print( time.ctime(), "(main) ERROR: %s missing config key 'name'" % config['config_file'] )
         sys.exit(1)
 
     if 'influxdb_url' in config and 'influxdb_token' in config and 'influxdb_org' in config:
@@ -881,7 +1160,7 @@ if __name__ == "__main__":
     if 'logroot' in config:
         if not config['logroot']:
             print( time.ctime(), "(main) ERROR: 'logroot' in %s cannot be empty!" %
-                   args.config_file )
+                   config['config_file'] )
             sys.exit(1)
         config['text_output'] = True
     else:
@@ -897,9 +1176,6 @@ if __name__ == "__main__":
     if 'temphost' in config:
         config['logtemps'] = True
         print( time.ctime(), "(main) found temphost, logtemps is enabled" )
-        if 'tempport' not in config:
-            print( time.ctime(), "(main) ERROR: 'tempport' missing!")
-            sys.exit(1)
     else:
         config['logtemps'] = False
         print( time.ctime(), "(main) missing temphost, logtemps is disabled" )
@@ -909,69 +1185,59 @@ if __name__ == "__main__":
     if 'presshost' in config:
         config['logpress'] = True
         print( time.ctime(), "(main) found presshost, logpress is enabled" )
-        if 'pressport' not in config:
-            print( time.ctime(), "(main) ERROR: 'pressport' missing!")
-            sys.exit(1)
     else:
         config['logpress'] = False
         print( time.ctime(), "(main) missing presshost, logpress is disabled" )
 
+    if config.get( 'keep_connections' ):
+        print( time.ctime(), "(main) keep_connections is set, controller connections "
+                             "stay open between polls" )
+
+    # everything needed by the enabled loggers must be in the config file
+    #
+    if not check_config( config, config['config_file'] ):
+        sys.exit(1)
+
     # If we're logging temperatures then get everything needed for that
     #
     if config['logtemps']:
 
         # get the temperature channels to log from the config file
         #
-        if 'tempchans' in config:
-            temp_channels = config['tempchans'].split(',')
-        else:
-            print( time.ctime(), "(main) ERROR: %s missing config key "
-                                 "'tempchans'" % args.config_file )
-            sys.exit(1)
-        if temp_channels == ['']:
-            temp_channels=[]          # if the input is blank, make sure it is length 0
+        temp_channels = csv_field( config, 'tempchans' )
+
+        # build the query for each temperature channel once, here.
+        # if the channel is not a digit ('A', 'C2', etc.) then it's a temperature channel,
+        # otherwise if it's a digit ('1', '2') then it's a heater.
+        # they are sent together as one compound query, separated by semicolons
+        #
+        config['tempcmds'] = [ (b'HTR? %s' if chit.isdigit() else b'KRDG? %s')
+                               % chit.encode( 'UTF-8' ) for chit in temp_channels ]
+        config['tempquery'] = b';'.join( config['tempcmds'] ) + b'\n'
 
         # get the temperature channel headers from the config file
         #
-        if 'temphdrs' in config:
-            temp_hdrs = config['temphdrs'].split(',')
-            htr_hdrs = []
-            for thdr in temp_hdrs:
-                if "HTR" in thdr:
-                    htr_hdrs.append(thdr)
-            if len(htr_hdrs) != 2:
-                htr_hdrs = ["HTR1", "HTR2"]
-            config['heater_header'] = htr_hdrs
-        else:
-            print( time.ctime(), "(main) ERROR: %s missing config key "
-                                 "'temphdrs'" % args.config_file )
-            sys.exit(1)
-        if temp_hdrs == ['']:
-            temp_hdrs=[]            # if the input is blank, make sure it is length 0
+        temp_hdrs = csv_field( config, 'temphdrs' )
+        # the two heater headers label the heater plot, otherwise use the default labels
+        htr_hdrs = [ thdr for thdr in temp_hdrs if "HTR" in thdr ]
+        config['heater_header'] = htr_hdrs if len(htr_hdrs) == 2 else ["HTR1", "HTR2"]
 
-                # get the temperature channel formats from the config file
+        # get the temperature channel formats from the config file
         #
-        if 'tempfmts' in config:
-            temp_fmts = config['tempfmts'].split(',')
-        else:
-            print( time.ctime(), "(main) ERROR: %s missing config key "
-                                 "'tempfmts'" % args.config_file )
-            sys.exit(1)
-        if temp_fmts == ['']:
-            temp_fmts=[]            # if the input is blank, make sure it is length 0
+        temp_fmts = csv_field( config, 'tempfmts' )
 
         # must have the same number of temp headers, temp channels, and temp formats
         #
-        if len(temp_channels) != len(temp_hdrs) or len(temp_channels) != len(temp_fmts):
+        counts = ( len(temp_channels), len(temp_hdrs), len(temp_fmts) )
+        if len( set(counts) ) != 1:
             print( time.ctime(), "(main) ERROR: must have same number of "
-                                 "tempchans (%d), temphdrs (%d) and tempfmts (%d)" %
-                   ( len(temp_channels), len(temp_hdrs), len(temp_fmts) ) )
+                                 "tempchans (%d), temphdrs (%d) and tempfmts (%d)" % counts )
             sys.exit(1)
 
-        # get temperature logging rate from config file
+        # the header and the formatter for one line of the temperature log (date, then each channel)
         #
-        if 'temprate' not in config:
-            config['temprate'] = 60
+        config['tempheader'] = 'datetime, ' + config['temphdrs'] + '\n'
+        config['templine'] = ( '{:}, ' + config['tempfmts'] + '\n' ).format
     else:
         config['heater_header'] = ["HTR1", "HTR2"]
 
@@ -979,121 +1245,66 @@ if __name__ == "__main__":
     #
     if config['logpress']:
 
-        # get the pressure numbetr of channels the controller has from the config file
-        #
-        if 'pressnumchans' in config:
-            press_num_channels = config['pressnumchans']
-        else:
-            print( time.ctime(), "(main) ERROR: %s missing config key "
-                                 "'pressnumchans'" % args.config_file )
-            sys.exit(1)
-        if press_num_channels <= 0:
-            print( time.ctime(), "(main) ERROR: 'pressnumchans' controller "
-                                 "must have at least one channel" )
-            sys.exit(1)
-
         # get the pressure channels to log from the config file
         #
-        if 'presschans' in config:
-            press_channels = config['presschans']
-        else:
-            print( time.ctime(), "(main) ERROR: %s missing config key "
-                                 "'presschans'" % args.config_file )
-            sys.exit(1)
-        if len(press_channels) <= 0:
-            print( time.ctime(), "(main) ERROR: 'presschans' must have "
-                                 "at least one active channel" )
-            sys.exit(1)
+        press_channels = config['presschans']
 
         # get the pressure channel headers from the config file
         #
-        if 'presshdrs' in config:
-            press_hdrs = config['presshdrs'].split(',')
-        else:
-            print( time.ctime(), "(main) ERROR: %s missing config key "
-                                 "'presshdrs'" % args.config_file )
-            sys.exit(1)
-        if press_hdrs == ['']:
-            press_hdrs=[]            # if the input is blank, make sure it is length 0
+        press_hdrs = csv_field( config, 'presshdrs' )
 
         # get the pressure channel formats from the config file
         #
-        if 'pressfmts' in config:
-            press_fmts = config['pressfmts'].split(',')
-        else:
-            print( time.ctime(), "(main) ERROR: %s missing config key "
-                                 "'pressfmts'" % args.config_file )
-            sys.exit(1)
-        if press_fmts == ['']:
-            press_fmts=[]            # if the input is blank, make sure it is length 0
+        press_fmts = csv_field( config, 'pressfmts' )
 
         # must have the same number of press channels, headers, and formats
         #
-        if len(press_channels) != len(press_hdrs) or len(press_channels) != len(press_fmts):
+        counts = ( len(press_channels), len(press_hdrs), len(press_fmts) )
+        if len( set(counts) ) != 1:
             print( time.ctime(), "(main) ERROR: must have same number of "
-                                 "presschans (%d), presshdrs (%d), and pressfmts (%d)" %
-                   ( len(press_channels), len(press_hdrs), len(press_fmts) ) )
+                                 "presschans (%d), presshdrs (%d), and pressfmts (%d)" % counts )
             sys.exit(1)
 
-        # get pressure logging rate from config file
+        # the header and the formatter for one line of the pressure log (date, then each channel)
         #
-        if 'pressrate' not in config:
-            config['pressrate'] = 60
+        config['pressheader'] = 'datetime, ' + config['presshdrs'] + '\n'
+        config['pressline'] = ( '{:}, ' + config['pressfmts'] + '\n' ).format
 
     # create project directory if needed
     if config['text_output']:
         project_dir = os.path.join(config['logroot'], config['name'])
-        if not os.path.exists( project_dir ):
-            print( time.ctime(), "(main) creating ", project_dir )
-            try:
-                os.mkdir( project_dir )
-            except Exception as exc:
-                print( time.ctime(), "(main) exception creating directory:", str(exc) )
+        try:
+            os.makedirs( project_dir, exist_ok=True )
+        except OSError as exc:
+            print( time.ctime(), "(main) exception creating directory:", str(exc) )
 
-    config['jobs_started'] = 0
-    # if we have everything needed for temperature logging then start a thread
+    # the loggers: the config flag that enables each one, its rate key, the
+    # function its thread runs, what it logs, and the host key it needs
     #
-    if config['logtemps']:
-        print( time.ctime(), "(main) starting temperature logging for %s" % config['name'] )
-        temp_logging = Job( interval=timedelta(seconds=config['temprate']), execute=logtemp,
-                            **config )
-        temp_logging.start()
-        config['jobs_started'] += 1
-    else:
-        temp_logging = None
-        print( time.ctime(),
-               "(main) temperature logging disabled: missing one or more of "
-               "temphost, tempport, temprate, tempchans" )
+    loggers = ( ( 'logtemps', 'temprate',  logtemp,  "temperature", 'temphost' ),
+                ( 'logpress', 'pressrate', logpress, "pressure",    'presshost' ) )
 
-    # if we have everything needed for pressure logging then start a thread
+    # if we have everything needed for a logger then start a thread for it
     #
-    if config['logpress']:
-        print( time.ctime(), "(main) starting pressure logging" )
-        press_logging = Job( interval=timedelta(seconds=config['pressrate']), execute=logpress,
-                            **config )
-        press_logging.start()
-        config['jobs_started'] += 1
-    else:
-        press_logging = None
-        print( time.ctime(),
-               "(main) pressure logging disabled: missing one or more of "
-               "presshost, pressport, pressrate, presschans" )
+    jobs = []
+    for enabled, rate, execute, what, host in loggers:
+        if config[enabled]:
+            print( time.ctime(), "(main) starting %s logging for %s" % ( what, config['name'] ) )
+            job = Job( interval=float(config[rate]), execute=execute, **config )
+            job.start()
+            jobs.append( job )
+        else:
+            print( time.ctime(), "(main) %s logging disabled: missing %s" % ( what, host ) )
 
     # nothing to do
     #
-    if not config['jobs_started']:
+    if not jobs:
         print( time.ctime(), "(main) no logging started. bye!" )
         sys.exit(0)
 
-    # sleep while the threads do the work
+    # wait while the threads do the work, until a signal arrives
     #
-    while True:
-        try:
-            time.sleep(1)
-        except ProgramKilled:
-            print( time.ctime(), "(main) program killed" )
-            if temp_logging:
-                temp_logging.stop()
-            if press_logging:
-                press_logging.stop()
-            break
+    stop_event.wait()
+    print( time.ctime(), "(main) program killed" )
+    for job in jobs:
+        job.stop()